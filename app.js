@@ -97,8 +97,13 @@ async function fetchCoverPreview(file, role, autoFixCovers) {
 }
 
 function renderPreview(data, imageEl, metaEl) {
-  imageEl.src = data.preview_data_url;
-  imageEl.hidden = false;
+  if (data.preview_url) {
+    imageEl.src = data.preview_url;
+    imageEl.hidden = false;
+  } else {
+    imageEl.removeAttribute("src");
+    imageEl.hidden = true;
+  }
 
   const finalInfo = data.final || {};
   const dims = finalInfo.width && finalInfo.height ? `${finalInfo.width}x${finalInfo.height}` : "unknown";
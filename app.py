@@ -1,21 +1,29 @@
 from __future__ import annotations
 
-import base64
+import functools
+import json
+import re
+import shutil
 import tempfile
-from io import BytesIO
+import time
+import unicodedata
+from operator import itemgetter
 from pathlib import Path
+from urllib.parse import quote
+from uuid import uuid4
 
-from flask import Flask, jsonify, render_template, request, send_file
+from flask import Flask, Response, abort, jsonify, render_template, request, send_file, url_for
 from werkzeug.utils import secure_filename
 
 from formatter.cover_validator import (
     KDP_COVER_HELP_URL,
-    auto_correct_cover_to_kdp,
     render_cover_report,
+    validate_and_correct_cover,
     validate_cover_image,
 )
-from formatter.pipeline import create_production_package
+from formatter.pipeline import UNSAFE_NAME_RE, create_production_package, stream_zip
 from formatter.profiles import PROFILES
+from formatter.uploads import TMP_ROOT, UploadRequest, store_upload
 
 ALLOWED_MANUSCRIPT_EXT = {
     ".doc",
@@ -32,28 +40,61 @@ ALLOWED_MANUSCRIPT_EXT = {
 }
 ALLOWED_IMAGE_EXT = {".jpg", ".jpeg", ".png", ".webp", ".tif", ".tiff"}
 
+# Cover previews are served from disk by token instead of inlined as base64.
+PREVIEW_ROOT = Path(TMP_ROOT) / "cover_previews"
+PREVIEW_TTL_SECONDS = 15 * 60
+# TMP_ROOT may be RAM-backed, so only images a browser can show are kept,
+# each one capped, and the oldest go first once the whole store is over.
+PREVIEW_MIME_TYPES = {"image/jpeg", "image/png", "image/webp"}
+PREVIEW_MAX_FILE_BYTES = 10 * 1024 * 1024
+PREVIEW_MAX_STORE_BYTES = 200 * 1024 * 1024
+PREVIEW_TOKEN_RE = re.compile(r"[0-9a-f]{32}")
+
 app = Flask(__name__)
+app.request_class = UploadRequest
 app.config["MAX_CONTENT_LENGTH"] = 100 * 1024 * 1024  # 100MB
 
 
+@app.before_request
+def reject_oversize_upload():
+    # Decided from the header alone, before anything touches the body, so an
+    # oversize upload is never spooled or parsed.
+    content_length = request.content_length
+    if content_length and content_length > app.config["MAX_CONTENT_LENGTH"]:
+        abort(413)
+
+
+@app.errorhandler(413)
+def upload_too_large(_exc):
+    limit_mb = app.config["MAX_CONTENT_LENGTH"] // (1024 * 1024)
+    return jsonify({"error": f"Upload is too large. The limit is {limit_mb}MB per request."}), 413
+
+
+# Profiles are fixed at import time, so the listing is serialized once.
+PROFILES_JSON = json.dumps(
+    [
+        {
+            "key": profile.key,
+            "label": profile.label,
+            "description": profile.description,
+            "output_type": profile.output_type,
+        }
+        for profile in PROFILES.values()
+    ]
+)
+
+
 @app.get("/")
 def index():
-    return render_template("index.html", profiles=PROFILES.values())
+    if app.jinja_env.auto_reload:
+        # Debug mode: pick up template edits instead of serving a stale page.
+        return render_template("index.html", profiles=PROFILES.values())
+    return _render_index(request.script_root)
 
 
 @app.get("/api/profiles")
 def list_profiles():
-    return jsonify(
-        [
-            {
-                "key": profile.key,
-                "label": profile.label,
-                "description": profile.description,
-                "output_type": profile.output_type,
-            }
-            for profile in PROFILES.values()
-        ]
-    )
+    return Response(PROFILES_JSON, mimetype="application/json")
 
 
 @app.post("/api/format")
@@ -96,57 +137,57 @@ def format_manuscript():
     front_cover = request.files.get("front_cover")
     back_cover = request.files.get("back_cover")
 
+    # The work dir outlives this view: it is removed once the streamed ZIP has
+    # been sent (or straight away if formatting fails).
+    tmp_dir = Path(tempfile.mkdtemp(prefix="ebook_format_", dir=TMP_ROOT))
     try:
-        with tempfile.TemporaryDirectory(prefix="ebook_format_") as tmp:
-            tmp_dir = Path(tmp)
-            manuscript_path = tmp_dir / manuscript_name
-            manuscript.save(manuscript_path)
-
-            cover_report_sections: list[str] = []
-            front_cover_path, front_report = _save_optional_image(
-                front_cover, tmp_dir, "front", auto_fix_covers
-            )
-            back_cover_path, back_report = _save_optional_image(
-                back_cover, tmp_dir, "back", auto_fix_covers
-            )
-            if front_report:
-                cover_report_sections.append(front_report)
-            if back_report:
-                cover_report_sections.append(back_report)
-
-            extra_reports = {}
-            if cover_report_sections:
-                extra_reports["COVER_VALIDATION_REPORT.txt"] = (
-                    "KDP Cover Validation Report\n"
-                    f"Reference: {KDP_COVER_HELP_URL}\n\n"
-                    + "\n\n".join(cover_report_sections)
-                    + "\n"
-                )
+        manuscript_path = tmp_dir / manuscript_name
+        store_upload(manuscript, manuscript_path)
 
-            archive_path = create_production_package(
-                manuscript_path=manuscript_path,
-                output_dir=tmp_dir,
-                title=title,
-                author=author,
-                profile_keys=profile_keys,
-                front_cover=front_cover_path,
-                back_cover=back_cover_path,
-                extra_reports=extra_reports,
+        cover_report_sections: list[str] = []
+        front_cover_path, front_report = _save_optional_image(
+            front_cover, tmp_dir, "front", auto_fix_covers
+        )
+        back_cover_path, back_report = _save_optional_image(
+            back_cover, tmp_dir, "back", auto_fix_covers
+        )
+        if front_report:
+            cover_report_sections.append(front_report)
+        if back_report:
+            cover_report_sections.append(back_report)
+
+        extra_reports = {}
+        if cover_report_sections:
+            extra_reports["COVER_VALIDATION_REPORT.txt"] = (
+                "KDP Cover Validation Report\n"
+                f"Reference: {KDP_COVER_HELP_URL}\n\n"
+                + "\n\n".join(cover_report_sections)
+                + "\n"
             )
-            data = archive_path.read_bytes()
-
-        download_name = f"{_safe_download_name(title)}_production_ready.zip"
-        return send_file(
-            BytesIO(data),
-            mimetype="application/zip",
-            as_attachment=True,
-            download_name=download_name,
+
+        members = create_production_package(
+            manuscript_path=manuscript_path,
+            output_dir=tmp_dir,
+            title=title,
+            author=author,
+            profile_keys=profile_keys,
+            front_cover=front_cover_path,
+            back_cover=back_cover_path,
+            extra_reports=extra_reports,
         )
     except ValueError as exc:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
         return jsonify({"error": str(exc)}), 400
     except Exception as exc:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
         return jsonify({"error": f"Formatting failed: {str(exc)}"}), 500
 
+    download_name = f"{_safe_download_name(title)}_production_ready.zip"
+    response = Response(stream_zip(members), mimetype="application/zip")
+    response.headers.set("Content-Disposition", "attachment", **_attachment_filename(download_name))
+    response.call_on_close(lambda: shutil.rmtree(tmp_dir, ignore_errors=True))
+    return response
+
 
 @app.post("/api/preview-cover")
 def preview_cover():
@@ -169,18 +210,19 @@ def preview_cover():
     if ext not in ALLOWED_IMAGE_EXT:
         return jsonify({"error": "Cover must be JPG, JPEG, PNG, WEBP, TIF, or TIFF."}), 400
 
-    with tempfile.TemporaryDirectory(prefix="cover_preview_") as tmp:
+    with tempfile.TemporaryDirectory(prefix="cover_preview_", dir=TMP_ROOT) as tmp:
         tmp_dir = Path(tmp)
         original_path = tmp_dir / f"{role}_cover_original{ext}"
-        upload.save(original_path)
+        store_upload(upload, original_path)
 
-        original_validation = validate_cover_image(original_path, role=role)
+        original_validation, corrected_path = validate_and_correct_cover(
+            original_path, tmp_dir, role, auto_fix_covers
+        )
         final_path = original_path
         final_validation = original_validation
         auto_corrected = False
 
-        if not original_validation.valid and auto_fix_covers:
-            corrected_path = auto_correct_cover_to_kdp(original_path, tmp_dir, role=role)
+        if corrected_path is not None:
             corrected_validation = validate_cover_image(corrected_path, role=role)
             if not corrected_validation.valid:
                 return (
@@ -197,9 +239,12 @@ def preview_cover():
             final_validation = corrected_validation
             auto_corrected = True
 
-        preview_bytes = final_path.read_bytes()
         mime = _guess_preview_mime(final_path)
-        preview_data_url = f"data:{mime};base64,{base64.b64encode(preview_bytes).decode('ascii')}"
+        token = _keep_cover_preview(final_path, mime)
+
+    message = _build_preview_message(role, original_validation.valid, auto_corrected, auto_fix_covers)
+    if token is None:
+        message += " This file is too large or not a format the browser can show, so there is no preview."
 
     return jsonify(
         {
@@ -209,13 +254,57 @@ def preview_cover():
             "can_proceed": final_validation.valid,
             "original": _validation_to_dict(original_validation),
             "final": _validation_to_dict(final_validation),
-            "preview_data_url": preview_data_url,
+            "preview_url": url_for("cover_preview_image", token=token) if token else None,
             "preview_mime": mime,
-            "message": _build_preview_message(role, original_validation.valid, auto_corrected, auto_fix_covers),
+            "message": message,
         }
     )
 
 
+@app.get("/api/preview-cover/<token>")
+def cover_preview_image(token: str):
+    _prune_cover_previews()
+    matches = list(PREVIEW_ROOT.glob(f"{token}.*")) if PREVIEW_TOKEN_RE.fullmatch(token) else []
+    if not matches:
+        return jsonify({"error": "Cover preview expired. Upload the cover again."}), 404
+    return send_file(matches[0], mimetype=_guess_preview_mime(matches[0]), max_age=PREVIEW_TTL_SECONDS)
+
+
+def _keep_cover_preview(path: Path, mime: str) -> str | None:
+    if mime not in PREVIEW_MIME_TYPES or path.stat().st_size > PREVIEW_MAX_FILE_BYTES:
+        return None
+    PREVIEW_ROOT.mkdir(parents=True, exist_ok=True)
+    token = uuid4().hex
+    path.replace(PREVIEW_ROOT / f"{token}{path.suffix.lower()}")
+    _prune_cover_previews()
+    return token
+
+
+def _prune_cover_previews() -> None:
+    cutoff = time.time() - PREVIEW_TTL_SECONDS
+    kept: list[tuple[float, int, Path]] = []
+    try:
+        entries = list(PREVIEW_ROOT.iterdir())
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        try:
+            entry_stat = entry.stat()
+            if entry_stat.st_mtime < cutoff:
+                entry.unlink()
+            else:
+                kept.append((entry_stat.st_mtime, entry_stat.st_size, entry))
+        except FileNotFoundError:
+            # Another worker pruned it first.
+            pass
+    total = sum(size for _, size, _ in kept)
+    for _, size, entry in sorted(kept, key=itemgetter(0)):
+        if total <= PREVIEW_MAX_STORE_BYTES:
+            break
+        entry.unlink(missing_ok=True)
+        total -= size
+
+
 def _save_optional_image(upload, tmp_dir: Path, prefix: str, auto_fix_covers: bool) -> tuple[Path | None, str | None]:
     if not upload or not upload.filename:
         return None, None
@@ -224,21 +313,22 @@ def _save_optional_image(upload, tmp_dir: Path, prefix: str, auto_fix_covers: bo
     if ext not in ALLOWED_IMAGE_EXT:
         raise ValueError(f"{prefix.title()} cover must be JPG, JPEG, PNG, WEBP, TIF, or TIFF.")
     original_out = tmp_dir / f"{prefix}_cover_original{ext}"
-    upload.save(original_out)
+    store_upload(upload, original_out)
 
-    validation = validate_cover_image(original_out, role=prefix)
+    validation, corrected_out = validate_and_correct_cover(original_out, tmp_dir, prefix, auto_fix_covers)
     if validation.valid:
         return original_out, render_cover_report(prefix, validation, auto_corrected=False)
 
+    error_lines = "\n".join([f"- {e}" for e in validation.errors])
     if not auto_fix_covers:
-        error_lines = "\n".join([f"- {e}" for e in validation.errors])
         raise ValueError(
             f"{prefix.title()} cover does not meet KDP specs.\n"
             f"{error_lines}\n"
             "Enable 'Auto-correct covers to KDP spec' to fix automatically."
         )
+    if corrected_out is None:
+        raise ValueError(f"{prefix.title()} cover could not be auto-corrected.\n{error_lines}")
 
-    corrected_out = auto_correct_cover_to_kdp(original_out, tmp_dir, role=prefix)
     corrected_validation = validate_cover_image(corrected_out, role=prefix)
     if not corrected_validation.valid:
         corrected_errors = "\n".join([f"- {e}" for e in corrected_validation.errors])
@@ -257,8 +347,26 @@ def _save_optional_image(upload, tmp_dir: Path, prefix: str, auto_fix_covers: bo
     return corrected_out, combined_report
 
 
+@functools.lru_cache(maxsize=8)
+def _render_index(script_root: str) -> str:
+    # Besides the fixed PROFILES, the page only depends on the mount prefix
+    # its static url_for() links carry, so it is rendered once per prefix.
+    return render_template("index.html", profiles=PROFILES.values())
+
+
+def _attachment_filename(download_name: str) -> dict[str, str]:
+    # Same RFC 5987 fallback send_file uses for non-ASCII download names.
+    try:
+        download_name.encode("ascii")
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize("NFKD", download_name).encode("ascii", "ignore").decode("ascii")
+        quoted = quote(download_name, safe="!#$&+-.^_`|~")
+        return {"filename": simple, "filename*": f"UTF-8''{quoted}"}
+    return {"filename": download_name}
+
+
 def _safe_download_name(value: str) -> str:
-    cleaned = "".join(ch if ch.isalnum() else "_" for ch in value).strip("_")
+    cleaned = UNSAFE_NAME_RE.sub("_", value).strip("_")
     return cleaned[:80] or "book"
 
 
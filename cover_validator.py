@@ -1,9 +1,10 @@
 from __future__ import annotations
 
+import os
 from dataclasses import dataclass
 from pathlib import Path
 
-from PIL import Image, ImageOps, UnidentifiedImageError
+from PIL import Image, UnidentifiedImageError
 
 KDP_COVER_HELP_URL = "https://kdp.amazon.com/en_US/help/topic/G200645690"
 
@@ -33,23 +34,44 @@ class CoverValidationResult:
 
 
 def validate_cover_image(path: Path, role: str = "cover") -> CoverValidationResult:
-    errors: list[str] = []
-    warnings: list[str] = []
-
+    path_stat = path.stat()
+    if _size_mb(path_stat) >= KDP_MAX_SIZE_MB:
+        return _oversize_cover(path_stat)
     try:
         with Image.open(path) as img:
-            fmt = (img.format or "").upper()
-            mode = img.mode
-            width, height = img.size
-            dpi = img.info.get("dpi")
+            return probe_cover(img, path_stat)
     except UnidentifiedImageError as exc:
-        return CoverValidationResult(
-            valid=False,
-            errors=[f"{role.title()} image is unreadable: {exc}"],
-            warnings=[],
-        )
+        return _unreadable_cover(role, exc)
+
+
+def validate_and_correct_cover(
+    path: Path, output_dir: Path, role: str, auto_fix: bool
+) -> tuple[CoverValidationResult, Path | None]:
+    # Validation and auto-correction share one open image, so the source is
+    # only parsed (and, when correcting, decoded) once. Oversize files fail
+    # on the stat alone unless they are about to be corrected anyway.
+    path_stat = path.stat()
+    if not auto_fix and _size_mb(path_stat) >= KDP_MAX_SIZE_MB:
+        return _oversize_cover(path_stat), None
+    try:
+        with Image.open(path) as img:
+            validation = probe_cover(img, path_stat)
+            if validation.valid or not auto_fix:
+                return validation, None
+            return validation, auto_correct_cover_to_kdp_from_image(img, output_dir, role)
+    except UnidentifiedImageError as exc:
+        return _unreadable_cover(role, exc), None
 
-    size_mb = path.stat().st_size / (1024 * 1024)
+
+def probe_cover(img: Image.Image, path_stat: os.stat_result) -> CoverValidationResult:
+    errors: list[str] = []
+    warnings: list[str] = []
+
+    fmt = (img.format or "").upper()
+    mode = img.mode
+    width, height = img.size
+    dpi = img.info.get("dpi")
+    size_mb = _size_mb(path_stat)
 
     if fmt not in KDP_ALLOWED_FORMATS:
         errors.append(f"Format must be JPEG or TIFF. Uploaded format is {fmt or 'unknown'}.")
@@ -78,7 +100,7 @@ def validate_cover_image(path: Path, role: str = "cover") -> CoverValidationResu
             errors.append(f"DPI must be 72. Current DPI is approximately {x_dpi:.1f}x{y_dpi:.1f}.")
 
     if size_mb >= KDP_MAX_SIZE_MB:
-        errors.append(f"File size must be below {KDP_MAX_SIZE_MB}MB. Current size is {size_mb:.2f}MB.")
+        errors.append(_size_error(size_mb))
 
     if mode != "RGB":
         errors.append(f"Color mode must be RGB. Current mode is {mode}.")
@@ -103,20 +125,42 @@ def validate_cover_image(path: Path, role: str = "cover") -> CoverValidationResu
     )
 
 
-def auto_correct_cover_to_kdp(path: Path, output_dir: Path, role: str) -> Path:
-    with Image.open(path) as img:
-        if img.mode != "RGB":
-            img = img.convert("RGB")
-        fitted = ImageOps.contain(img, (KDP_IDEAL_WIDTH, KDP_IDEAL_HEIGHT), method=Image.Resampling.LANCZOS)
-
-    # Neutral canvas keeps full artwork without destructive cropping.
-    canvas = Image.new("RGB", (KDP_IDEAL_WIDTH, KDP_IDEAL_HEIGHT), color=(248, 248, 248))
-    x = (KDP_IDEAL_WIDTH - fitted.width) // 2
-    y = (KDP_IDEAL_HEIGHT - fitted.height) // 2
-    canvas.paste(fitted, (x, y))
+def auto_correct_cover_to_kdp_from_image(img: Image.Image, output_dir: Path, role: str) -> Path:
+    if img.format == "JPEG":
+        # libjpeg scales by 1/2, 1/4 or 1/8 while decoding; keeping 2x the
+        # target leaves the final resample enough detail to work with.
+        img.draft("RGB", (KDP_IDEAL_WIDTH * 2, KDP_IDEAL_HEIGHT * 2))
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    scale = min(KDP_IDEAL_WIDTH / img.width, KDP_IDEAL_HEIGHT / img.height)
+    # Same rounding as ImageOps.contain: the tighter side lands exactly on the
+    # target, the other is scaled to keep the aspect ratio.
+    if img.width / img.height > KDP_IDEAL_WIDTH / KDP_IDEAL_HEIGHT:
+        size = (KDP_IDEAL_WIDTH, round(img.height / img.width * KDP_IDEAL_WIDTH))
+    else:
+        size = (round(img.width / img.height * KDP_IDEAL_HEIGHT), KDP_IDEAL_HEIGHT)
+    if img.size == size:
+        fitted = img
+    else:
+        # Near-1:1 downscales gain nothing visible from LANCZOS's wider kernel.
+        method = Image.Resampling.BILINEAR if 0.9 <= scale <= 1 else Image.Resampling.LANCZOS
+        # reducing_gap box-reduces large downscales first, so the final filter
+        # only runs over a few times the target size.
+        fitted = img.resize(size, method, reducing_gap=3.0)
+
+    if fitted.size == (KDP_IDEAL_WIDTH, KDP_IDEAL_HEIGHT):
+        canvas = fitted
+    else:
+        # Neutral canvas keeps full artwork without destructive cropping.
+        canvas = Image.new("RGB", (KDP_IDEAL_WIDTH, KDP_IDEAL_HEIGHT), color=(248, 248, 248))
+        canvas.paste(fitted, ((KDP_IDEAL_WIDTH - fitted.width) // 2, (KDP_IDEAL_HEIGHT - fitted.height) // 2))
 
     out_path = output_dir / f"{role}_cover_kdp_ready.jpg"
-    canvas.save(out_path, format="JPEG", quality=95, optimize=True, dpi=(72, 72))
+    # Single-pass Huffman coding and 4:2:2 chroma: optimize=True costs a second
+    # encode pass for a few percent of size that KDP covers do not need.
+    canvas.save(
+        out_path, format="JPEG", quality=90, optimize=False, progressive=False, subsampling=1, dpi=(72, 72)
+    )
     return out_path
 
 
@@ -139,3 +183,23 @@ def render_cover_report(role: str, result: CoverValidationResult, auto_corrected
         lines.extend([f"  * {warn}" for warn in result.warnings])
     return "\n".join(lines)
 
+
+def _unreadable_cover(role: str, exc: Exception) -> CoverValidationResult:
+    return CoverValidationResult(
+        valid=False,
+        errors=[f"{role.title()} image is unreadable: {exc}"],
+        warnings=[],
+    )
+
+
+def _oversize_cover(path_stat: os.stat_result) -> CoverValidationResult:
+    size_mb = _size_mb(path_stat)
+    return CoverValidationResult(valid=False, errors=[_size_error(size_mb)], warnings=[], size_mb=size_mb)
+
+
+def _size_mb(path_stat: os.stat_result) -> float:
+    return path_stat.st_size / (1024 * 1024)
+
+
+def _size_error(size_mb: float) -> str:
+    return f"File size must be below {KDP_MAX_SIZE_MB}MB. Current size is {size_mb:.2f}MB."
@@ -1,21 +1,32 @@
 from __future__ import annotations
 
-from html import escape
+import functools
+import mmap
+import zipfile
 from pathlib import Path
 from uuid import uuid4
 
 from docx import Document
 from docx.shared import Inches, Pt
 from ebooklib import epub
+from markupsafe import escape as _markup_escape
 from reportlab.lib.pagesizes import inch
 from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
 from reportlab.lib.units import inch as rl_inch
 from reportlab.lib.utils import ImageReader
 from reportlab.platypus import Image, PageBreak, Paragraph, SimpleDocTemplate, Spacer
 
-from formatter.parser import Block, Manuscript
+from formatter.parser import CHAPTER, Manuscript
 from formatter.profiles import FormatProfile
 
+# Image formats that are already compressed; deflating them again in the EPUB
+# container costs CPU for no size gain.
+PRECOMPRESSED_MEDIA_TYPES = {"image/jpeg", "image/png", "image/webp", "image/gif"}
+
+# Built once: styles are only read during layout, so every export (and every
+# export thread) can share the sample sheet and the derived per-profile styles.
+PDF_SAMPLE_STYLES = getSampleStyleSheet()
+
 
 def export_docx(
     manuscript: Manuscript,
@@ -54,7 +65,7 @@ def export_docx(
 
     wrote_any_chapter = False
     for block in manuscript.blocks:
-        if block.kind == "chapter":
+        if block.kind == CHAPTER:
             if wrote_any_chapter:
                 doc.add_page_break()
             h = doc.add_paragraph(block.text)
@@ -124,51 +135,44 @@ def export_epub(
 
     title_page = epub.EpubHtml(title="Title Page", file_name="title.xhtml", lang="en")
     title_page.content = (
-        f"<html><body><div class='title-page'><h1>{escape(manuscript.title)}</h1>"
-        f"<p>By {escape(manuscript.author or 'Unknown Author')}</p></div></body></html>"
+        f"<html><body><div class='title-page'><h1>{_escape(manuscript.title)}</h1>"
+        f"<p>By {_escape(manuscript.author or 'Unknown Author')}</p></div></body></html>"
     )
     book.add_item(title_page)
     chapters.append(title_page)
 
     if front_cover:
-        cover_bytes = front_cover.read_bytes()
-        book.set_cover(front_cover.name, cover_bytes)
-        front_image_item = epub.EpubImage(
-            uid="front_cover_img",
-            file_name=f"images/{front_cover.name}",
-            media_type=_guess_image_media_type(front_cover),
-            content=cover_bytes,
-        )
-        book.add_item(front_image_item)
+        # set_cover registers the image item itself; our own cover page below
+        # references it, so no second copy or generated page is needed.
+        book.set_cover(f"images/{front_cover.name}", front_cover.read_bytes(), create_page=False)
         cover_page = epub.EpubHtml(title="Cover", file_name="front-cover.xhtml", lang="en")
         cover_page.content = (
-            f"<html><body><div class='cover'><img src='images/{escape(front_cover.name)}' alt='Front cover'/></div>"
+            f"<html><body><div class='cover'><img src='images/{_escape(front_cover.name)}' alt='Front cover'/></div>"
             "</body></html>"
         )
         book.add_item(cover_page)
         chapters.insert(0, cover_page)
 
-    chapter_buckets = _group_blocks_by_chapter(manuscript.blocks)
-    for idx, (chapter_title, paragraphs) in enumerate(chapter_buckets, start=1):
+    for idx, (chapter_title, paragraphs) in enumerate(manuscript.chapters, start=1):
         chapter = epub.EpubHtml(title=chapter_title, file_name=f"chap_{idx}.xhtml", lang="en")
-        body_parts = [f"<h1>{escape(chapter_title)}</h1>"] if chapter_title else []
-        body_parts.extend(f"<p>{escape(p)}</p>" for p in paragraphs)
-        chapter.content = f"<html><body>{''.join(body_parts)}</body></html>"
+        heading = f"<h1>{_escape(chapter_title)}</h1>" if chapter_title else ""
+        body = "".join(map("<p>{}</p>".format, map(_escape, paragraphs)))
+        chapter.content = f"<html><body>{heading}{body}</body></html>"
         book.add_item(chapter)
         chapters.append(chapter)
 
+    back_item = None
     if back_cover:
-        back_bytes = back_cover.read_bytes()
+        # Content is filled in below, while the file is mapped for the write.
         back_item = epub.EpubImage(
             uid="back_cover_img",
             file_name=f"images/{back_cover.name}",
             media_type=_guess_image_media_type(back_cover),
-            content=back_bytes,
         )
         book.add_item(back_item)
         back_page = epub.EpubHtml(title="Back Cover", file_name="back-cover.xhtml", lang="en")
         back_page.content = (
-            f"<html><body><div class='cover'><img src='images/{escape(back_cover.name)}' alt='Back cover'/></div>"
+            f"<html><body><div class='cover'><img src='images/{_escape(back_cover.name)}' alt='Back cover'/></div>"
             "</body></html>"
         )
         book.add_item(back_page)
@@ -178,7 +182,14 @@ def export_epub(
     book.add_item(epub.EpubNcx())
     book.add_item(epub.EpubNav())
     book.spine = ["nav", *chapters]
-    epub.write_epub(str(output_path), book)
+    if back_item is None:
+        _write_epub(book, output_path)
+        return
+    # Hand ebooklib a read-only mapping; zipfile accepts any buffer, so the
+    # image is written from the page cache without a bytes copy.
+    with back_cover.open("rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as back_map:
+        back_item.content = back_map
+        _write_epub(book, output_path)
 
 
 def export_pdf(
@@ -197,25 +208,9 @@ def export_pdf(
         bottomMargin=profile.margin_in * inch,
     )
 
-    styles = getSampleStyleSheet()
-    body = ParagraphStyle(
-        name="Body",
-        parent=styles["BodyText"],
-        fontName=profile.body_font,
-        fontSize=profile.body_size_pt,
-        leading=profile.body_size_pt * profile.line_spacing,
-        firstLineIndent=profile.first_line_indent_in * rl_inch,
-        spaceAfter=8,
-    )
-    chapter_style = ParagraphStyle(
-        name="Chapter",
-        parent=styles["Heading1"],
-        fontName=profile.body_font,
-        fontSize=profile.body_size_pt + 4,
-        leading=(profile.body_size_pt + 4) * 1.2,
-        alignment=1,  # center
-        spaceBefore=20,
-        spaceAfter=20,
+    styles = PDF_SAMPLE_STYLES
+    body, chapter_style = _pdf_paragraph_styles(
+        profile.body_font, profile.body_size_pt, profile.line_spacing, profile.first_line_indent_in
     )
 
     story = []
@@ -224,20 +219,20 @@ def export_pdf(
         story.append(_build_pdf_cover_image(front_cover, profile))
         story.append(PageBreak())
 
-    story.append(Paragraph(escape(manuscript.title), styles["Title"]))
+    story.append(Paragraph(_escape(manuscript.title), styles["Title"]))
     story.append(Spacer(1, 12))
-    story.append(Paragraph(escape(f"By {manuscript.author or 'Unknown Author'}"), styles["Heading3"]))
+    story.append(Paragraph(_escape(f"By {manuscript.author or 'Unknown Author'}"), styles["Heading3"]))
     story.append(PageBreak())
 
     wrote_chapter = False
     for block in manuscript.blocks:
-        if block.kind == "chapter":
+        if block.kind == CHAPTER:
             if wrote_chapter:
                 story.append(PageBreak())
-            story.append(Paragraph(escape(block.text), chapter_style))
+            story.append(Paragraph(_escape(block.text), chapter_style))
             wrote_chapter = True
         else:
-            story.append(Paragraph(escape(block.text), body))
+            story.append(Paragraph(_escape(block.text), body))
 
     if back_cover:
         story.append(PageBreak())
@@ -246,26 +241,36 @@ def export_pdf(
     doc.build(story)
 
 
-def _group_blocks_by_chapter(blocks: list[Block]) -> list[tuple[str, list[str]]]:
-    buckets: list[tuple[str, list[str]]] = []
-    current_title = "Chapter 1"
-    current_paragraphs: list[str] = []
-    seen_chapter = False
-
-    for block in blocks:
-        if block.kind == "chapter":
-            if current_paragraphs or seen_chapter:
-                buckets.append((current_title, current_paragraphs))
-            current_title = block.text
-            current_paragraphs = []
-            seen_chapter = True
-        else:
-            current_paragraphs.append(block.text)
+@functools.lru_cache(maxsize=32)
+def _pdf_paragraph_styles(
+    body_font: str, body_size_pt: int, line_spacing: float, first_line_indent_in: float
+) -> tuple[ParagraphStyle, ParagraphStyle]:
+    body = ParagraphStyle(
+        name="Body",
+        parent=PDF_SAMPLE_STYLES["BodyText"],
+        fontName=body_font,
+        fontSize=body_size_pt,
+        leading=body_size_pt * line_spacing,
+        firstLineIndent=first_line_indent_in * rl_inch,
+        spaceAfter=8,
+    )
+    chapter_style = ParagraphStyle(
+        name="Chapter",
+        parent=PDF_SAMPLE_STYLES["Heading1"],
+        fontName=body_font,
+        fontSize=body_size_pt + 4,
+        leading=(body_size_pt + 4) * 1.2,
+        alignment=1,  # center
+        spaceBefore=20,
+        spaceAfter=20,
+    )
+    return body, chapter_style
 
-    if current_paragraphs or not buckets:
-        buckets.append((current_title, current_paragraphs))
 
-    return buckets
+def _escape(value: str) -> str:
+    # MarkupSafe's C speedups escape in one native pass; str() drops the Markup
+    # wrapper so the result concatenates like any other string.
+    return str(_markup_escape(value))
 
 
 def _guess_image_media_type(path: Path) -> str:
@@ -281,6 +286,12 @@ def _guess_image_media_type(path: Path) -> str:
     return "application/octet-stream"
 
 
+def _write_epub(book: epub.EpubBook, output_path: Path) -> None:
+    writer = _EpubWriter(str(output_path), book, {})
+    writer.process()
+    writer.write()
+
+
 def _build_pdf_cover_image(path: Path, profile: FormatProfile) -> Image:
     frame_w = profile.page_width_in * inch - (2 * profile.margin_in * inch)
     frame_h = profile.page_height_in * inch - (2 * profile.margin_in * inch)
@@ -298,3 +309,23 @@ def _build_pdf_cover_image(path: Path, profile: FormatProfile) -> Image:
 
     img.hAlign = "CENTER"
     return img
+
+
+class _EpubWriter(epub.EpubWriter):
+    # Same as ebooklib's writer, except already-compressed images are stored
+    # instead of deflated a second time.
+    def _write_items(self):
+        for item in self.book.get_items():
+            if isinstance(item, epub.EpubNcx):
+                self.out.writestr(f"{self.book.FOLDER_NAME}/{item.file_name}", self._get_ncx())
+            elif isinstance(item, epub.EpubNav):
+                self.out.writestr(f"{self.book.FOLDER_NAME}/{item.file_name}", self._get_nav(item))
+            elif item.manifest:
+                compress_type = (
+                    zipfile.ZIP_STORED if item.media_type in PRECOMPRESSED_MEDIA_TYPES else zipfile.ZIP_DEFLATED
+                )
+                self.out.writestr(
+                    f"{self.book.FOLDER_NAME}/{item.file_name}", item.get_content(), compress_type=compress_type
+                )
+            else:
+                self.out.writestr(item.file_name, item.get_content())
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from collections.abc import Sequence
 from pathlib import Path
 
 from formatter.profiles import FormatProfile
@@ -10,7 +11,7 @@ KDP_ACCEPTED_SOURCE_EXTS = {".html", ".htm", ".zip", ".txt", ".rtf", ".pdf"}
 KDP_DEPRECATED_NOTICE = "As of March 2025, KDP no longer supports MOBI for fixed-layout content."
 
 
-def build_kdp_compliance_report(source_path: Path, selected_profiles: list[FormatProfile]) -> str:
+def build_kdp_compliance_report(source_path: Path, selected_profiles: Sequence[FormatProfile]) -> str:
     source_ext = source_path.suffix.lower()
     lines: list[str] = [
         "KDP Submission Compliance Report",
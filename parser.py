@@ -1,54 +1,134 @@
 from __future__ import annotations
 
+import functools
 import html
+import mmap
+import multiprocessing
+import os
 import re
 import shutil
 import subprocess
 import tempfile
+import threading
 import zipfile
-from dataclasses import dataclass
+from collections import deque
+from collections.abc import Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
 
 import ebooklib
-from docx import Document
 from ebooklib import epub
+from lxml import etree
 from pypdf import PdfReader
 
+try:
+    import pypdfium2 as pdfium
+except ImportError:  # optional: PDFium's native text extraction, else pypdf
+    pdfium = None
 
-@dataclass
+
+# Block kinds. Identifier-like literals are interned, so every Block shares
+# these two objects and kind checks resolve on identity.
+CHAPTER = "chapter"
+PARAGRAPH = "paragraph"
+
+
+@dataclass(slots=True)
 class Block:
-    kind: str  # chapter | paragraph
+    kind: str  # CHAPTER | PARAGRAPH
     text: str
 
 
-@dataclass
+@dataclass(slots=True)
 class Manuscript:
     title: str
     author: str
     blocks: list[Block]
-
-
-CHAPTER_RE = re.compile(r"^(chapter|book|part)\s+[\w\d]+", re.IGNORECASE)
+    # (heading, paragraphs) per chapter, grouped once for every exporter.
+    chapters: list[tuple[str, list[str]]] = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self.chapters = _group_blocks_by_chapter(self.blocks)
+
+
+# "Chapter 3" / "Book II" / "Part One" headings, or numbered ones like "12. Title".
+HEADING_RE = re.compile(r"(?i)(?P<named>(chapter|book|part)\s+[\w\d]+)|(?P<numbered>\d{1,3}[.: -]\s+\w+)")
+PARAGRAPH_BREAK_RE = re.compile(r"\n\s*\n")
+# Tags that end a line of text; both HTML_MARKUP_RE and the EPUB tree walk
+# turn them (and <br>) into line breaks.
+HTML_BLOCK_TAGS = ("p", "div", "h1", "h2", "h3", "h4", "h5", "h6", "li", "section", "article", "hr", "tr")
+# The EPUB tree walk breaks lines at these as well: ebooklib used to
+# pretty-print the body before the regex ran, which put line breaks around
+# every structural element, not only around the regex's block tags.
+EPUB_BLOCK_TAGS = {
+    *HTML_BLOCK_TAGS, "address", "aside", "blockquote", "caption", "center", "dd", "details", "dl", "dt",
+    "fieldset", "figcaption", "figure", "footer", "form", "header", "hgroup", "main", "menu", "nav", "ol",
+    "pre", "summary", "table", "ul",
+}
+# Tags that sit inside a run of text. The EPUB tree walk adds nothing for
+# them and a space for any other element, as the regex does for any tag.
+HTML_INLINE_TAGS = {
+    "a", "abbr", "b", "bdi", "bdo", "cite", "code", "data", "del", "dfn", "em", "font", "i", "ins", "kbd",
+    "mark", "q", "s", "samp", "small", "span", "strike", "strong", "sub", "sup", "time", "tt", "u", "var",
+}
+# Comments and script/style elements go first, in a pass of their own: in a
+# combined pattern a bare "<" earlier in the text could open a generic tag
+# match that swallows "<script", letting the script body through as text.
+HTML_HIDDEN_RE = re.compile(r"(?is)<!--.*?-->|<(script|style).*?>.*?</\1>")
+# Then block-level tags (line breaks) and any other tag (a space) in one
+# pass, with _html_markup_replacement() deciding what each match becomes.
+HTML_MARKUP_RE = re.compile(rf"(?is)</?({'|'.join((*HTML_BLOCK_TAGS, 'br'))})[^>]*>|<[^>]+>")
+# \par (a line break, even as the start of \pard), hex escapes, control
+# words and group braces; one pass, \par listed first so it wins over the
+# generic control word exactly as the old replace-first ordering did.
+RTF_MARKUP_RE = re.compile(r"\\par|\\'[0-9a-fA-F]{2}|\\[a-zA-Z]+-?\d* ?|[{}]")
+
+WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+OFFICE_DOCUMENT_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"
+PACKAGE_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+# Text equivalents of run children, as python-docx's Run.text renders them
+# (w:br is handled separately: only line breaks count, not page breaks).
+WORD_RUN_TEXT = {
+    f"{WORD_NS}tab": "\t",
+    f"{WORD_NS}ptab": "\t",
+    f"{WORD_NS}cr": "\n",
+    f"{WORD_NS}noBreakHyphen": "-",
+}
+
+# PDFium is not thread-safe, even across separate documents.
+PDFIUM_LOCK = threading.Lock()
+# PDFium reports a hyphen at a line break as \x02 (the break itself is
+# dropped); other C0 controls are not text and XML outputs reject them.
+PDFIUM_TEXT_TRANSLATION = {
+    **{code: None for code in range(0x20) if chr(code) not in "\t\n\r"},
+    0x02: "-",
+}
+
+ZIP_TEXT_EXTENSIONS = {".html", ".htm", ".txt", ".md", ".rtf"}
+# Below this much uncompressed text, starting worker processes costs more than
+# parsing the members inline.
+ZIP_PARALLEL_MIN_BYTES = 8 * 1024 * 1024
 
 
 def parse_manuscript(path: Path, title: str, author: str) -> Manuscript:
     suffix = path.suffix.lower()
     if suffix == ".docx":
-        lines = _parse_docx(path)
+        stream = _parse_docx(path)
     elif suffix == ".doc":
-        lines = _parse_doc(path)
+        stream = _parse_doc(path)
     elif suffix in {".txt", ".md"}:
-        lines = _parse_text(path)
+        stream = _parse_text(path)
     elif suffix in {".html", ".htm"}:
-        lines = _parse_html(path)
+        stream = _parse_html(path)
     elif suffix == ".zip":
-        lines = _parse_zip(path)
+        stream = _parse_zip(path)
     elif suffix == ".rtf":
-        lines = _parse_rtf(path)
+        stream = _parse_rtf(path)
     elif suffix == ".pdf":
-        lines = _parse_pdf(path)
+        stream = _parse_pdf(path)
     elif suffix == ".epub":
-        lines = _parse_epub(path)
+        stream = _parse_epub(path)
     elif suffix == ".mobi":
         raise ValueError(
             "MOBI is deprecated for many KDP workflows. Upload DOCX/EPUB/KPF or another accepted source file."
@@ -60,24 +140,33 @@ def parse_manuscript(path: Path, title: str, author: str) -> Manuscript:
             "Unsupported manuscript type. Use DOC/DOCX/KPF/EPUB/HTML/ZIP/TXT/RTF/PDF/MD sources."
         )
 
-    blocks = _classify_blocks(lines)
+    # Parsers yield blocks as they go; this is the only list that is built.
+    blocks = list(stream)
     if not blocks:
         raise ValueError("The manuscript appears empty after parsing.")
 
     return Manuscript(title=title.strip(), author=author.strip(), blocks=blocks)
 
 
-def _parse_docx(path: Path) -> list[str]:
-    doc = Document(path)
-    lines: list[str] = []
-    for p in doc.paragraphs:
-        text = p.text.strip()
-        if text:
-            lines.append(_normalize_space(text))
-    return lines
-
-
-def _parse_doc(path: Path) -> list[str]:
+def _parse_docx(path: Path) -> Iterator[Block]:
+    # Streams the main document part instead of building python-docx's object
+    # graph. Same paragraphs as Document(path).paragraphs: body-level w:p only
+    # (no tables), text from runs and hyperlink runs.
+    with zipfile.ZipFile(path) as zf, zf.open(_docx_main_part(zf)) as fh:
+        for _, p in etree.iterparse(fh, tag=f"{WORD_NS}p", resolve_entities=False):
+            body = p.getparent()
+            if body.tag == f"{WORD_NS}body":
+                text = _normalize_space(_docx_paragraph_text(p))
+                if text:
+                    yield _text_block(text)
+                # Drop finished paragraphs (and any tables before them) so the
+                # tree never holds more than the current one.
+                p.clear()
+                while p.getprevious() is not None:
+                    del body[0]
+
+
+def _parse_doc(path: Path) -> Iterator[Block]:
     soffice = shutil.which("soffice")
     if not soffice:
         raise ValueError(
@@ -94,120 +183,268 @@ def _parse_doc(path: Path) -> list[str]:
         converted = list(tmp_dir.glob("*.docx"))
         if not converted:
             raise ValueError("DOC conversion failed. Please re-save the manuscript as DOCX and upload again.")
-        return _parse_docx(converted[0])
+        # Drained before the temp dir (and the converted file) goes away.
+        yield from _parse_docx(converted[0])
 
 
-def _parse_text(path: Path) -> list[str]:
-    raw = path.read_text(encoding="utf-8", errors="ignore")
+def _parse_text(path: Path) -> Iterator[Block]:
+    raw = _read_text(path)
     return _split_text_to_blocks(raw)
 
 
-def _parse_html(path: Path) -> list[str]:
-    raw = path.read_text(encoding="utf-8", errors="ignore")
+def _parse_html(path: Path) -> Iterator[Block]:
+    raw = _read_text(path)
     text = _html_to_text(raw)
     return _split_text_to_blocks(text)
 
 
-def _parse_zip(path: Path) -> list[str]:
-    blocks: list[str] = []
+def _parse_zip(path: Path) -> list[Block]:
     with zipfile.ZipFile(path) as zf:
-        names = sorted(zf.namelist())
-        for name in names:
-            if name.endswith("/"):
-                continue
-            ext = Path(name).suffix.lower()
-            if ext in {".html", ".htm", ".txt", ".md", ".rtf"}:
-                raw = zf.read(name).decode("utf-8", errors="ignore")
-                if ext in {".html", ".htm"}:
-                    blocks.extend(_split_text_to_blocks(_html_to_text(raw)))
-                elif ext == ".rtf":
-                    blocks.extend(_split_text_to_blocks(_rtf_to_text(raw)))
-                else:
-                    blocks.extend(_split_text_to_blocks(raw))
+        members = [
+            (name, ext)
+            for name in sorted(zf.namelist())
+            if not name.endswith("/") and (ext := Path(name).suffix.lower()) in ZIP_TEXT_EXTENSIONS
+        ]
+        workers = min(len(members), os.cpu_count() or 1)
+        if workers > 1 and sum(zf.getinfo(name).file_size for name, _ in members) >= ZIP_PARALLEL_MIN_BYTES:
+            # Members are independent and CPU-bound; worker processes sidestep
+            # the GIL. Each member is read only as it is submitted and at most
+            # two per worker are in flight, so the archive is never held
+            # decompressed as a whole. Results are taken in member order.
+            results = []
+            pending: deque[Future[list[Block]]] = deque()
+            with ProcessPoolExecutor(max_workers=workers, mp_context=_zip_pool_context()) as pool:
+                for name, ext in members:
+                    if len(pending) >= workers * 2:
+                        results.append(pending.popleft().result())
+                    pending.append(pool.submit(_parse_zip_member, zf.read(name), ext))
+                results.extend(future.result() for future in pending)
+        else:
+            results = [_parse_zip_member(zf.read(name), ext) for name, ext in members]
+    blocks = [block for result in results for block in result]
     if not blocks:
         raise ValueError("ZIP upload must contain at least one HTML, TXT, MD, or RTF manuscript file.")
     return blocks
 
 
-def _parse_rtf(path: Path) -> list[str]:
-    raw = path.read_text(encoding="utf-8", errors="ignore")
+# Created on first use rather than at import, so importing this module
+# leaves the importer's multiprocessing state alone.
+@functools.lru_cache(maxsize=1)
+def _zip_pool_context() -> multiprocessing.context.BaseContext:
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("spawn")
+    # forkserver children never inherit the request threads' locks; preloading
+    # this module spares every worker the parser imports.
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload([__name__])
+    return context
+
+
+def _parse_zip_member(raw: bytes, ext: str) -> list[Block]:
+    text = raw.decode("utf-8", errors="ignore")
+    if ext in {".html", ".htm"}:
+        text = _html_to_text(text)
+    elif ext == ".rtf":
+        text = _rtf_to_text(text)
+    return list(_split_text_to_blocks(text))
+
+
+def _parse_rtf(path: Path) -> Iterator[Block]:
+    raw = _read_text(path)
     return _split_text_to_blocks(_rtf_to_text(raw))
 
 
-def _parse_pdf(path: Path) -> list[str]:
-    reader = PdfReader(str(path))
-    pages = [page.extract_text() or "" for page in reader.pages]
-    raw = "\n\n".join(pages).strip()
-    if not raw:
+def _parse_pdf(path: Path) -> Iterator[Block]:
+    # Page by page: pages used to be joined with a blank line, so a page break
+    # always ended a paragraph anyway, and the whole book is never one string.
+    pages = _pdfium_page_texts(path) if pdfium is not None else _pypdf_page_texts(path)
+    found_text = False
+    for text in pages:
+        for block in _split_text_to_blocks(text):
+            found_text = True
+            yield block
+    if not found_text:
         raise ValueError("PDF text extraction returned no text. Use DOCX or EPUB for best formatting quality.")
-    return _split_text_to_blocks(raw)
 
 
-def _parse_epub(path: Path) -> list[str]:
+def _parse_epub(path: Path) -> list[Block]:
     book = epub.read_epub(str(path))
-    blocks: list[str] = []
-    for item in book.get_items_of_type(ebooklib.ITEM_DOCUMENT):
-        raw = item.get_body_content().decode("utf-8", errors="ignore")
-        blocks.extend(_split_text_to_blocks(_html_to_text(raw)))
+    blocks = [
+        block
+        for item in book.get_items_of_type(ebooklib.ITEM_DOCUMENT)
+        for block in _epub_document_blocks(item.get_content())
+    ]
     if not blocks:
         raise ValueError("Could not extract readable content from EPUB.")
     return blocks
 
 
-def _split_text_to_blocks(raw: str) -> list[str]:
-    chunks = re.split(r"\n\s*\n", raw)
-    blocks: list[str] = []
-    for chunk in chunks:
-        lines = [_normalize_space(line) for line in chunk.splitlines() if _normalize_space(line)]
+def _epub_document_blocks(content: bytes) -> Iterator[Block]:
+    # Walks the XHTML tree that libxml2 builds straight from the item's bytes
+    # (get_body_content() would parse, re-serialize and then need decoding).
+    # Structural tags break lines and other tags add a space, as before;
+    # inline ones add nothing, so "<em>it</em>." reads "it." not "it .".
+    try:
+        root = etree.fromstring(content, etree.HTMLParser(encoding="utf-8", remove_comments=True, remove_pis=True))
+    except etree.XMLSyntaxError:
+        root = None
+    if root is None:
+        return
+    body = root.find("body")
+    if body is None:
+        body = root
+    etree.strip_elements(body, "script", "style", with_tail=False)
+    pieces: list[str] = []
+    for event, element in etree.iterwalk(body, events=("start", "end")):
+        if element.tag in EPUB_BLOCK_TAGS:
+            pieces.append("\n")
+        elif element.tag == "br":
+            # A void tag: the regex sees it once, the walk twice.
+            if event == "start":
+                pieces.append("\n")
+        elif element.tag not in HTML_INLINE_TAGS:
+            pieces.append(" ")
+        text = element.text if event == "start" else element.tail
+        if text:
+            pieces.append(text)
+    yield from _split_text_to_blocks("".join(pieces))
+
+
+def _read_text(path: Path) -> str:
+    # Decodes straight from the page cache: no bytes copy of the whole file
+    # alongside the decoded text, as read_text() holds at its peak.
+    with path.open("rb") as fh:
+        if not os.fstat(fh.fileno()).st_size:
+            return ""
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            text = str(mm, "utf-8", "ignore")
+    # Same universal-newline translation read_text() applies.
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+
+def _docx_main_part(zf: zipfile.ZipFile) -> str:
+    with zf.open("_rels/.rels") as fh:
+        for rel in etree.parse(fh).getroot().iterchildren(f"{PACKAGE_REL_NS}Relationship"):
+            if rel.get("Type") == OFFICE_DOCUMENT_REL:
+                return rel.get("Target").lstrip("/")
+    return "word/document.xml"
+
+
+def _docx_paragraph_text(p: etree._Element) -> str:
+    parts: list[str] = []
+    for item in p.iterchildren(f"{WORD_NS}r", f"{WORD_NS}hyperlink"):
+        runs = item.iterchildren(f"{WORD_NS}r") if item.tag == f"{WORD_NS}hyperlink" else (item,)
+        for run in runs:
+            for child in run:
+                if child.tag == f"{WORD_NS}t":
+                    parts.append(child.text or "")
+                elif child.tag == f"{WORD_NS}br":
+                    if child.get(f"{WORD_NS}type", "textWrapping") == "textWrapping":
+                        parts.append("\n")
+                elif child.tag in WORD_RUN_TEXT:
+                    parts.append(WORD_RUN_TEXT[child.tag])
+    return "".join(parts)
+
+
+def _pdfium_page_texts(path: Path) -> Iterator[str]:
+    # The lock is taken per call into PDFium, never across a yield, so other
+    # requests' PDFs interleave while the caller splits this page.
+    with PDFIUM_LOCK:
+        pdf = pdfium.PdfDocument(str(path))
+        page_count = len(pdf)
+    try:
+        for index in range(page_count):
+            with PDFIUM_LOCK:
+                page = pdf[index]
+                textpage = page.get_textpage()
+                text = textpage.get_text_bounded()
+                textpage.close()
+                page.close()
+            yield text.translate(PDFIUM_TEXT_TRANSLATION)
+    finally:
+        with PDFIUM_LOCK:
+            pdf.close()
+
+
+def _pypdf_page_texts(path: Path) -> Iterator[str]:
+    for page in PdfReader(str(path)).pages:
+        yield page.extract_text() or ""
+
+
+def _split_text_to_blocks(raw: str) -> Iterator[Block]:
+    for chunk in PARAGRAPH_BREAK_RE.split(raw):
+        lines = [line for line in map(_normalize_space, chunk.splitlines()) if line]
         if not lines:
             continue
+        # Lines are normalized and non-empty, so joining them with single
+        # spaces is already normalized. A joined chunk still gets classified:
+        # "12" over "THE END" reads as one heading.
         if _looks_like_chapter_heading(lines[0]):
-            blocks.append(lines[0])
+            yield Block(kind=CHAPTER, text=lines[0])
             if len(lines) > 1:
-                blocks.append(_normalize_space(" ".join(lines[1:])))
+                yield _text_block(" ".join(lines[1:]))
+        elif len(lines) > 1:
+            yield _text_block(" ".join(lines))
         else:
-            blocks.append(_normalize_space(" ".join(lines)))
-    return blocks
+            yield Block(kind=PARAGRAPH, text=lines[0])
 
 
 def _html_to_text(raw: str) -> str:
-    scrubbed = re.sub(r"(?is)<(script|style).*?>.*?</\1>", " ", raw)
-    block_tags = r"(p|div|h1|h2|h3|h4|h5|h6|li|section|article|br|hr|tr)"
-    scrubbed = re.sub(rf"(?is)</?{block_tags}[^>]*>", "\n", scrubbed)
-    scrubbed = re.sub(r"(?is)<[^>]+>", " ", scrubbed)
-    return html.unescape(scrubbed)
+    return html.unescape(HTML_MARKUP_RE.sub(_html_markup_replacement, HTML_HIDDEN_RE.sub(" ", raw)))
+
+
+def _html_markup_replacement(match: re.Match[str]) -> str:
+    return "\n" if match.group(1) else " "
 
 
 def _rtf_to_text(raw: str) -> str:
-    text = raw.replace("\\par", "\n")
-    text = re.sub(r"\\'[0-9a-fA-F]{2}", " ", text)
-    text = re.sub(r"\\[a-zA-Z]+-?\d* ?", " ", text)
-    text = text.replace("{", " ").replace("}", " ")
-    return text
+    return RTF_MARKUP_RE.sub(_rtf_markup_replacement, raw)
+
+
+def _rtf_markup_replacement(match: re.Match[str]) -> str:
+    return "\n" if match[0] == "\\par" else " "
 
 
-def _classify_blocks(lines: list[str]) -> list[Block]:
-    blocks: list[Block] = []
-    for line in lines:
-        if _looks_like_chapter_heading(line):
-            blocks.append(Block(kind="chapter", text=line))
+def _group_blocks_by_chapter(blocks: list[Block]) -> list[tuple[str, list[str]]]:
+    buckets: list[tuple[str, list[str]]] = []
+    current_title = "Chapter 1"
+    current_paragraphs: list[str] = []
+    seen_chapter = False
+
+    for block in blocks:
+        if block.kind == CHAPTER:
+            if current_paragraphs or seen_chapter:
+                buckets.append((current_title, current_paragraphs))
+            current_title = block.text
+            current_paragraphs = []
+            seen_chapter = True
         else:
-            blocks.append(Block(kind="paragraph", text=line))
-    return blocks
+            current_paragraphs.append(block.text)
+
+    if current_paragraphs or not buckets:
+        buckets.append((current_title, current_paragraphs))
+
+    return buckets
+
+
+def _text_block(text: str) -> Block:
+    return Block(kind=CHAPTER if _looks_like_chapter_heading(text) else PARAGRAPH, text=text)
 
 
 def _looks_like_chapter_heading(line: str) -> bool:
-    if CHAPTER_RE.match(line):
+    match = HEADING_RE.match(line)
+    if match and match["named"]:
         return True
-    words = line.split()
-    if len(words) > 9:
+    # More than nine words. Callers pass whitespace-normalized text, so
+    # counting single spaces avoids building the word list split() would.
+    if line.count(" ") > 8:
         return False
-    if line.isupper() and len(line) <= 80:
-        return True
-    if re.match(r"^\d{1,3}[.: -]\s+\w+", line):
-        return True
-    return False
+    return bool(match) or (len(line) <= 80 and line.isupper())
 
 
 def _normalize_space(text: str) -> str:
-    return re.sub(r"\s+", " ", text).strip()
+    # str.split() with no separator drops every whitespace run (and the ends)
+    # in C; same result as collapsing \s+ and stripping.
+    return " ".join(text.split())
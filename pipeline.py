@@ -1,12 +1,32 @@
 from __future__ import annotations
 
+import functools
+import io
+import mmap
+import os
+import re
 import shutil
+import zipfile
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from operator import itemgetter
 from pathlib import Path
 
 from formatter.exporters import export_docx, export_epub, export_pdf
 from formatter.kdp import build_kdp_compliance_report
 from formatter.parser import parse_manuscript
-from formatter.profiles import PROFILES
+from formatter.profiles import PROFILES, FormatProfile
+
+ZIP_STREAM_CHUNK_SIZE = 1024 * 1024
+# Outputs that are already ZIP containers; deflating them again costs CPU for
+# next to no size gain. PDFs are not listed: reportlab writes uncompressed
+# page streams, which still shrink by about a third.
+ZIP_STORED_SUFFIXES = {".epub", ".docx", ".kpf"}
+# Runs of anything str.isalnum() rejects (\W plus "_"); shared with app.py's
+# download names.
+UNSAFE_NAME_RE = re.compile(r"[\W_]+")
+
+EXPORTERS = {"docx": export_docx, "epub": export_epub, "pdf": export_pdf}
 
 
 def create_production_package(
@@ -18,95 +38,169 @@ def create_production_package(
     front_cover: Path | None = None,
     back_cover: Path | None = None,
     extra_reports: dict[str, str] | None = None,
-) -> Path:
+) -> list[tuple[str, Path | str]]:
+    # Members are (arcname, file on disk) for generated outputs and the KPF
+    # source, or (arcname, text) for reports that only ever live in the ZIP.
+    # Only known keys reach the cache, once each and in request order, so its
+    # entries are bounded by PROFILES rather than by whatever was posted.
+    selected = _resolve_profiles(tuple(dict.fromkeys(key for key in profile_keys if key in PROFILES)))
+
+    if manuscript_path.suffix.lower() == ".kpf":
+        kpf_name = manuscript_path.name
+        members: list[tuple[str, Path | str]] = [
+            (kpf_name, manuscript_path),
+            (
+                "README_FORMATTING.txt",
+                "\n".join(
+                    [
+                        f"Title: {title}",
+                        f"Author: {author}",
+                        "",
+                        f"Detected source: {kpf_name}",
+                        "KPF is already a KDP-native package.",
+                        "No manuscript reflow conversion was applied.",
+                        "",
+                        "Next steps:",
+                        "1) Open KPF in Kindle Create to verify layout.",
+                        "2) Upload KPF directly to KDP if quality is approved.",
+                    ]
+                )
+                + "\n",
+            ),
+        ]
+        return _with_reports(members, manuscript_path, selected, extra_reports)
+
     safe_stem = _safe_slug(title) or "book"
     build_dir = output_dir / f"{safe_stem}_production"
     if build_dir.exists():
         shutil.rmtree(build_dir)
     build_dir.mkdir(parents=True, exist_ok=True)
 
-    selected = []
-    for key in profile_keys:
-        if key in PROFILES:
-            selected.append(PROFILES[key])
-    if not selected:
-        selected.append(PROFILES["kindle_epub"])
+    manuscript = parse_manuscript(manuscript_path, title=title, author=author)
+    tasks = [
+        (EXPORTERS[profile.output_type], build_dir / f"{safe_stem}_{profile.key}.{profile.output_type}", profile)
+        for profile in selected
+        if profile.output_type in EXPORTERS
+    ]
+    # Profiles are independent and the exporters spend most of their time in
+    # zlib/PIL/libjpeg, which release the GIL, so threads overlap real work.
+    if tasks:
+        with ThreadPoolExecutor(max_workers=min(len(tasks), os.cpu_count() or 1)) as pool:
+            futures = [
+                pool.submit(exporter, manuscript, out_path, profile, front_cover, back_cover)
+                for exporter, out_path, profile in tasks
+            ]
+            for future in as_completed(futures):
+                future.result()
 
-    if manuscript_path.suffix.lower() == ".kpf":
-        kpf_name = manuscript_path.name
-        shutil.copy2(manuscript_path, build_dir / kpf_name)
-        (build_dir / "README_FORMATTING.txt").write_text(
+    members = [
+        *_package_members(build_dir),
+        (
+            "README_FORMATTING.txt",
             "\n".join(
                 [
-                    f"Title: {title}",
-                    f"Author: {author}",
+                    f"Title: {manuscript.title}",
+                    f"Author: {manuscript.author}",
                     "",
-                    f"Detected source: {kpf_name}",
-                    "KPF is already a KDP-native package.",
-                    "No manuscript reflow conversion was applied.",
+                    "Generated formats:",
+                    *[f"- {profile.label} ({profile.key})" for profile in selected],
                     "",
-                    "Next steps:",
-                    "1) Open KPF in Kindle Create to verify layout.",
-                    "2) Upload KPF directly to KDP if quality is approved.",
+                    "Final pre-publish checks:",
+                    "1) Open each output and verify chapter breaks, TOC, and images.",
+                    "2) Validate EPUB with your store previewer before publishing.",
+                    "3) Run a final typo/proof pass on generated files.",
                 ]
+            ),
+        ),
+    ]
+    return _with_reports(members, manuscript_path, selected, extra_reports)
+
+
+def stream_zip(members: Iterable[tuple[str, Path | str]]) -> Iterator[bytes]:
+    # Compressed bytes are handed out as soon as zipfile produces them, so the
+    # archive never exists as a whole on disk or in memory.
+    sink = _ZipStreamSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for arcname, source in members:
+            if isinstance(source, str):
+                zf.writestr(arcname, source.encode("utf-8"))
+                if data := sink.drain():
+                    yield data
+                continue
+            info = zipfile.ZipInfo.from_file(source, arcname)
+            info.compress_type = (
+                zipfile.ZIP_STORED if source.suffix.lower() in ZIP_STORED_SUFFIXES else zipfile.ZIP_DEFLATED
             )
-            + "\n",
-            encoding="utf-8",
-        )
-        (build_dir / "KDP_COMPLIANCE_REPORT.txt").write_text(
-            build_kdp_compliance_report(manuscript_path, selected), encoding="utf-8"
-        )
-        if extra_reports:
-            for file_name, content in extra_reports.items():
-                (build_dir / file_name).write_text(content, encoding="utf-8")
-        zip_base = output_dir / f"{safe_stem}_production_ready"
-        archive_path = shutil.make_archive(str(zip_base), "zip", build_dir)
-        return Path(archive_path)
+            with zf.open(info, "w") as dest:
+                for chunk in _iter_mapped_chunks(source):
+                    dest.write(chunk)
+                    if data := sink.drain():
+                        yield data
+    if data := sink.drain():
+        yield data
 
-    manuscript = parse_manuscript(manuscript_path, title=title, author=author)
-    for profile in selected:
-        if profile.output_type == "docx":
-            out_path = build_dir / f"{safe_stem}_{profile.key}.docx"
-            export_docx(manuscript, out_path, profile, front_cover, back_cover)
-        elif profile.output_type == "epub":
-            out_path = build_dir / f"{safe_stem}_{profile.key}.epub"
-            export_epub(manuscript, out_path, profile, front_cover, back_cover)
-        elif profile.output_type == "pdf":
-            out_path = build_dir / f"{safe_stem}_{profile.key}.pdf"
-            export_pdf(manuscript, out_path, profile, front_cover, back_cover)
-
-    manifest = build_dir / "README_FORMATTING.txt"
-    manifest.write_text(
-        "\n".join(
-            [
-                f"Title: {manuscript.title}",
-                f"Author: {manuscript.author}",
-                "",
-                "Generated formats:",
-                *[f"- {profile.label} ({profile.key})" for profile in selected],
-                "",
-                "Final pre-publish checks:",
-                "1) Open each output and verify chapter breaks, TOC, and images.",
-                "2) Validate EPUB with your store previewer before publishing.",
-                "3) Run a final typo/proof pass on generated files.",
-            ]
-        ),
-        encoding="utf-8",
-    )
-    (build_dir / "KDP_COMPLIANCE_REPORT.txt").write_text(
-        build_kdp_compliance_report(manuscript_path, selected), encoding="utf-8"
-    )
-    if extra_reports:
-        for file_name, content in extra_reports.items():
-            (build_dir / file_name).write_text(content, encoding="utf-8")
 
-    zip_base = output_dir / f"{safe_stem}_production_ready"
-    archive_path = shutil.make_archive(str(zip_base), "zip", build_dir)
-    return Path(archive_path)
+# Requests repeat the same handful of profile selections.
+@functools.lru_cache(maxsize=64)
+def _resolve_profiles(keys: tuple[str, ...]) -> tuple[FormatProfile, ...]:
+    return tuple(PROFILES[key] for key in keys) or (PROFILES["kindle_epub"],)
 
 
 def _safe_slug(value: str) -> str:
-    slug = "".join(ch.lower() if ch.isalnum() else "-" for ch in value)
-    while "--" in slug:
-        slug = slug.replace("--", "-")
-    return slug.strip("-")
+    return UNSAFE_NAME_RE.sub("-", value).strip("-").lower()
+
+
+def _iter_mapped_chunks(path: Path) -> Iterator[memoryview]:
+    # Slices of a read-only mapping: zipfile checksums and compresses straight
+    # from the page cache instead of from a fresh bytes copy of every chunk.
+    with path.open("rb") as fh:
+        size = os.fstat(fh.fileno()).st_size
+        if not size:
+            return
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+            for offset in range(0, size, ZIP_STREAM_CHUNK_SIZE):
+                with view[offset : offset + ZIP_STREAM_CHUNK_SIZE] as chunk:
+                    yield chunk
+
+
+def _with_reports(
+    members: list[tuple[str, Path | str]],
+    manuscript_path: Path,
+    selected: tuple[FormatProfile, ...],
+    extra_reports: dict[str, str] | None,
+) -> list[tuple[str, Path | str]]:
+    members.append(("KDP_COMPLIANCE_REPORT.txt", build_kdp_compliance_report(manuscript_path, selected)))
+    if extra_reports:
+        members.extend(extra_reports.items())
+    return sorted(members, key=itemgetter(0))
+
+
+def _package_members(build_dir: Path) -> list[tuple[str, Path]]:
+    return [(path.relative_to(build_dir).as_posix(), path) for path in build_dir.rglob("*") if path.is_file()]
+
+
+class _ZipStreamSink(io.RawIOBase):
+    # Unseekable on purpose: zipfile then writes data descriptors instead of
+    # seeking back to patch local headers.
+    def __init__(self) -> None:
+        super().__init__()
+        self._chunks: list[bytes | memoryview] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: bytes | memoryview) -> int:
+        # Kept as given: STORED members arrive as slices of their mapping,
+        # and stream_zip() drains before moving on to the next slice.
+        self._chunks.append(data)
+        return len(data)
+
+    def drain(self) -> bytes:
+        # The one copy per chunk: WSGI servers (gunicorn asserts it) only
+        # accept bytes.
+        if len(self._chunks) == 1 and isinstance(self._chunks[0], bytes):
+            data = self._chunks[0]
+        else:
+            data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import IO
+
+from flask import Request
+from werkzeug.datastructures import FileStorage
+
+# Minimum tmpfs size before /dev/shm is used for scratch space; Docker's 64MB
+# default would not even hold a single maximum-size upload.
+_MIN_SHM_BYTES = 1024 * 1024 * 1024
+
+
+def _default_tmp_root() -> str:
+    if os.path.isdir("/dev/shm") and shutil.disk_usage("/dev/shm").total >= _MIN_SHM_BYTES:
+        return "/dev/shm"
+    return tempfile.gettempdir()
+
+
+# Scratch root for uploads and per-request work dirs. Everything written
+# there is transient, so RAM-backed storage avoids disk I/O entirely.
+TMP_ROOT = os.environ.get("EBOOK_TMP_ROOT") or _default_tmp_root()
+
+
+class UploadRequest(Request):
+    def _get_file_stream(
+        self,
+        total_content_length: int | None,
+        content_type: str | None,
+        filename: str | None = None,
+        content_length: int | None = None,
+    ) -> IO[bytes]:
+        # Spool every file part to a named file while the multipart body is
+        # parsed, so store_upload() can link it into place instead of copying.
+        return tempfile.NamedTemporaryFile("wb+", prefix="upload_", dir=TMP_ROOT)
+
+
+def store_upload(upload: FileStorage, dst: Path) -> None:
+    spooled = getattr(upload.stream, "name", None)
+    if isinstance(spooled, str):
+        try:
+            os.link(spooled, dst)
+        except OSError:
+            # Cross-device or no hard-link support: copyfile() still copies
+            # in the kernel (sendfile on Linux) rather than through Python.
+            shutil.copyfile(spooled, dst)
+        return
+    upload.save(dst)